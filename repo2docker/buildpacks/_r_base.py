@@ -20,13 +20,12 @@ DEVTOOLS_VERSION = "2018-02-01"
 IRKERNEL_VERSION = "1.1"
 
 
-def rstudio_base_scripts():
-    """Base steps to install RStudio and shiny-server."""
-    return [
-        (
-            "root",
-            # Install RStudio!
-            r"""
+# Base steps to install RStudio and shiny-server, formatted once at import
+_RSTUDIO_BASE_SCRIPTS = (
+    (
+        "root",
+        # Install RStudio!
+        r"""
                 curl --silent --location --fail {rstudio_url} > /tmp/rstudio.deb && \
                 echo '{rstudio_checksum} /tmp/rstudio.deb' | md5sum -c - && \
                 apt-get update && \
@@ -36,25 +35,25 @@ def rstudio_base_scripts():
                 apt-get -qq clean && \
                 rm -rf /var/lib/apt/lists/*
                 """.format(
-                rstudio_url=RSTUDIO_URL, rstudio_checksum=RSTUDIO_CHECKSUM
-            ),
+            rstudio_url=RSTUDIO_URL, rstudio_checksum=RSTUDIO_CHECKSUM
         ),
-        (
-            "root",
-            # Install Shiny Server!
-            r"""
+    ),
+    (
+        "root",
+        # Install Shiny Server!
+        r"""
                 curl --silent --location --fail {url} > {deb} && \
                 echo '{checksum} {deb}' | md5sum -c - && \
                 dpkg -i {deb} && \
                 rm {deb}
                 """.format(
-                url=SHINY_URL, checksum=SHINY_CHECKSUM, deb="/tmp/shiny.deb"
-            ),
+            url=SHINY_URL, checksum=SHINY_CHECKSUM, deb="/tmp/shiny.deb"
         ),
-        (
-            "${NB_USER}",
-            # Install nbrsessionproxy
-            r"""
+    ),
+    (
+        "${NB_USER}",
+        # Install nbrsessionproxy
+        r"""
                 pip install --no-cache-dir jupyter-server-proxy==1.4.0 && \
                 pip install --no-cache-dir https://github.com/jupyterhub/jupyter-rsession-proxy/archive/d5efed5455870556fc414f30871d0feca675a4b4.zip && \
                 pip install --no-cache-dir https://github.com/ryanlovett/jupyter-shiny-proxy/archive/47557dc47e2aeeab490eb5f3eeae414cdde4a6a9.zip && \
@@ -62,16 +61,21 @@ def rstudio_base_scripts():
                 jupyter nbextension install --py jupyter_server_proxy --sys-prefix && \
                 jupyter nbextension enable --py jupyter_server_proxy --sys-prefix
                 """,
-        ),
-        (
-            # Not all of these locations are configurable; so we make sure
-            # they exist and have the correct permissions
-            "root",
-            r"""
+    ),
+    (
+        # Not all of these locations are configurable; so we make sure
+        # they exist and have the correct permissions
+        "root",
+        r"""
                 install -o ${NB_USER} -g ${NB_USER} -d /var/log/shiny-server && \
                 install -o ${NB_USER} -g ${NB_USER} -d /var/lib/shiny-server && \
                 install -o ${NB_USER} -g ${NB_USER} /dev/null /var/log/shiny-server.log && \
                 install -o ${NB_USER} -g ${NB_USER} /dev/null /var/run/shiny-server.pid
                 """,
-        ),
-    ]
+    ),
+)
+
+
+def rstudio_base_scripts():
+    """Base steps to install RStudio and shiny-server."""
+    return _RSTUDIO_BASE_SCRIPTS
@@ -11,6 +11,8 @@ import hashlib
 import escapism
 import xml.etree.ElementTree as ET
 
+from functools import lru_cache
+
 from traitlets import Dict
 
 # Only use syntax features supported by Docker 17.09
@@ -201,6 +203,24 @@ ENTRYPOINT_FILE = os.path.join(
 DEFAULT_NB_UID = 1000
 
 
+def _script_directives(scripts):
+    """Turn (user, script) tuples into USER and RUN Dockerfile directives"""
+    directives = []
+    last_user = "root"
+    for user, script in scripts:
+        if last_user != user:
+            directives.append("USER {}".format(user))
+            last_user = user
+        directives.append("RUN {}".format(textwrap.dedent(script.strip("\n"))))
+    return directives
+
+
+@lru_cache(maxsize=None)
+def _dockerfile_template():
+    """Compile the Dockerfile template once, it is the same for every BuildPack"""
+    return jinja2.Template(TEMPLATE)
+
+
 class BuildPack:
     """
     A composable BuildPack.
@@ -481,6 +501,10 @@ class BuildPack:
 
     @property
     def binder_dir(self):
+        # every binder_path() goes through here, only stat the directories once
+        if hasattr(self, "_binder_dir"):
+            return self._binder_dir
+
         has_binder = os.path.isdir("binder")
         has_dotbinder = os.path.isdir(".binder")
 
@@ -491,11 +515,12 @@ class BuildPack:
             )
 
         if has_dotbinder:
-            return ".binder"
+            self._binder_dir = ".binder"
         elif has_binder:
-            return "binder"
+            self._binder_dir = "binder"
         else:
-            return ""
+            self._binder_dir = ""
+        return self._binder_dir
 
     def binder_path(self, path):
         """Locate a file"""
@@ -510,37 +535,15 @@ class BuildPack:
         """
         build_args = build_args or {}
 
-        t = jinja2.Template(TEMPLATE)
+        t = _dockerfile_template()
 
-        build_script_directives = []
-        last_user = "root"
-        for user, script in self.get_build_scripts():
-            if last_user != user:
-                build_script_directives.append("USER {}".format(user))
-                last_user = user
-            build_script_directives.append(
-                "RUN {}".format(textwrap.dedent(script.strip("\n")))
-            )
+        build_script_directives = _script_directives(self.get_build_scripts())
 
-        assemble_script_directives = []
-        last_user = "root"
-        for user, script in self.get_assemble_scripts():
-            if last_user != user:
-                assemble_script_directives.append("USER {}".format(user))
-                last_user = user
-            assemble_script_directives.append(
-                "RUN {}".format(textwrap.dedent(script.strip("\n")))
-            )
+        assemble_script_directives = _script_directives(self.get_assemble_scripts())
 
-        preassemble_script_directives = []
-        last_user = "root"
-        for user, script in self.get_preassemble_scripts():
-            if last_user != user:
-                preassemble_script_directives.append("USER {}".format(user))
-                last_user = user
-            preassemble_script_directives.append(
-                "RUN {}".format(textwrap.dedent(script.strip("\n")))
-            )
+        preassemble_script_directives = _script_directives(
+            self.get_preassemble_scripts()
+        )
 
         # Based on a physical location of a build script on the host,
         # create a mapping between:
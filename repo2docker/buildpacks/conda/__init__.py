@@ -2,6 +2,8 @@
 import os
 import re
 from collections.abc import Mapping
+from functools import lru_cache
+from types import MappingProxyType
 
 from ruamel.yaml import YAML
 
@@ -9,12 +11,46 @@ from ..base import BaseImage
 from .._r_base import rstudio_base_scripts, IRKERNEL_VERSION
 from ...utils import is_local_pip_requirement
 
-# pattern for parsing conda dependency line
-PYTHON_REGEX = re.compile(r"python\s*=+\s*([\d\.]*)")
-R_REGEX = re.compile(r"r-base\s*=+\s*([\d\.]*)")
+# pattern for parsing the python and r-base pins of a conda dependency line
+DEPENDENCY_REGEX = re.compile(r"(?:(python)|(r-base))\s*=+\s*([\d\.]*)")
+# a pip requirement can only be local (see `is_local_pip_requirement`) if it
+# starts with a flag or a relative path, or references a file or relative URL
+MAYBE_LOCAL_PIP_REGEX = re.compile(r"^\s*[-.]|file://|://\.", re.MULTILINE)
+# default minor version for each major Python version, read-only
+MAJOR_PYTHONS = MappingProxyType({"2": "2.7", "3": "3.7"})
 # current directory
 HERE = os.path.dirname(os.path.abspath(__file__))
 
+# templates of the repository specific build steps, see `get_env_scripts`
+ENV_UPDATE_TEMPLATE = r"""
+    TIMEFORMAT='time: %3R' \
+    bash -c 'time mamba env update -p {env_prefix} -f "{environment_yml}" && \
+    time mamba clean --all -f -y && \
+    mamba list -p {env_prefix} \
+    '
+    """
+R_INSTALL_TEMPLATE = r"""
+    mamba install -p {env_prefix} r-base{r_pin} r-irkernel={irkernel_version} r-devtools -y && \
+    mamba clean --all -f -y && \
+    mamba list -p {env_prefix}
+    """
+RSTUDIO_CONF_TEMPLATE = r"""
+    echo auth-none=1 >> /etc/rstudio/rserver.conf && \
+    echo auth-minimum-user-id=0 >> /etc/rstudio/rserver.conf && \
+    echo "rsession-which-r={env_prefix}/bin/R" >> /etc/rstudio/rserver.conf && \
+    echo "rsession-ld-library-path={env_prefix}/lib" >> /etc/rstudio/rserver.conf && \
+    echo www-frame-origin=same >> /etc/rstudio/rserver.conf
+    """
+IRKERNEL_TEMPLATE = r"""
+    R --quiet -e "IRkernel::installspec(prefix='{env_prefix}')"
+    """
+
+
+@lru_cache(maxsize=None)
+def _conda_dir_files():
+    """Names of the files shipped in this directory, e.g. frozen environments"""
+    return frozenset(entry.name for entry in os.scandir(HERE))
+
 
 class CondaBuildPack(BaseImage):
     """A conda BuildPack.
@@ -86,7 +122,7 @@ class CondaBuildPack(BaseImage):
             )
         ]
 
-    major_pythons = {"2": "2.7", "3": "3.7"}
+    major_pythons = MAJOR_PYTHONS
 
     def get_build_script_files(self):
         """
@@ -123,7 +159,7 @@ class CondaBuildPack(BaseImage):
                 ] = "/tmp/kernel-environment.yml"
             else:
                 py_frozen_name = "environment.py-{py}.frozen.yml".format(py=py_version)
-                if os.path.exists(os.path.join(HERE, py_frozen_name)):
+                if py_frozen_name in _conda_dir_files():
                     frozen_name = py_frozen_name
                 else:
                     self.log.warning("No frozen env: %s", py_frozen_name)
@@ -132,6 +168,7 @@ class CondaBuildPack(BaseImage):
         return files
 
     _environment_yaml = None
+    _scanned_dependencies = None
 
     @property
     def environment_yaml(self):
@@ -139,21 +176,27 @@ class CondaBuildPack(BaseImage):
             return self._environment_yaml
 
         environment_yml = self.binder_path("environment.yml")
-        if not os.path.exists(environment_yml):
+        try:
+            st = os.stat(environment_yml)
+        except FileNotFoundError:
             self._environment_yaml = {}
             return self._environment_yaml
 
-        with open(environment_yml) as f:
-            env = YAML().load(f)
-            # check if the env file is empty, if so instantiate an empty dictionary.
-            if env is None:
-                env = {}
-            # check if the env file provided a dict-like thing not a list or other data structure.
-            if not isinstance(env, Mapping):
-                raise TypeError(
-                    "environment.yml should contain a dictionary. Got %r" % type(env)
-                )
-            self._environment_yaml = env
+        if st.st_size == 0:
+            # nothing to parse
+            env = None
+        else:
+            with open(environment_yml) as f:
+                env = YAML(typ="safe").load(f)
+        # check if the env file is empty, if so instantiate an empty dictionary.
+        if env is None:
+            env = {}
+        # check if the env file provided a dict-like thing not a list or other data structure.
+        if not isinstance(env, Mapping):
+            raise TypeError(
+                "environment.yml should contain a dictionary. Got %r" % type(env)
+            )
+        self._environment_yaml = env
 
         return self._environment_yaml
 
@@ -164,16 +207,59 @@ class CondaBuildPack(BaseImage):
         If there are any local references, e.g. `-e .`,
         stage the whole repo prior to installation.
         """
+        if hasattr(self, "_preassemble_env"):
+            return self._preassemble_env
+
         dependencies = self.environment_yaml.get("dependencies", [])
-        pip_requirements = None
-        for dep in dependencies:
-            if isinstance(dep, dict) and dep.get("pip"):
-                pip_requirements = dep["pip"]
-        if isinstance(pip_requirements, list):
-            for line in pip_requirements:
-                if is_local_pip_requirement(line):
-                    return False
-        return True
+        # only the last `pip` section is considered
+        pip_requirements = next(
+            (
+                dep["pip"]
+                for dep in reversed(dependencies)
+                if isinstance(dep, dict) and dep.get("pip")
+            ),
+            None,
+        )
+        self._preassemble_env = (
+            not isinstance(pip_requirements, list)
+            # one scan over all lines rules out most environments up front
+            or not MAYBE_LOCAL_PIP_REGEX.search("\n".join(pip_requirements))
+            or not any(is_local_pip_requirement(line) for line in pip_requirements)
+        )
+        return self._preassemble_env
+
+    def _scan_dependencies(self):
+        """Scan the dependencies of `environment.yml` in a single pass
+
+        Returns a tuple `(python_version, r_version, uses_r)` with the raw
+        version strings pinned for `python` and `r-base` (or None when not
+        pinned) and whether any `r-` package is installed.
+        """
+        if self._scanned_dependencies is not None:
+            return self._scanned_dependencies
+
+        py_version = None
+        r_version = None
+        uses_r = False
+        for dep in self.environment_yaml.get("dependencies", []):
+            if not isinstance(dep, str):
+                continue
+            if dep.startswith("r-"):
+                uses_r = True
+            elif not dep.startswith("python"):
+                # cheap prefix check, most dependencies are neither pin
+                continue
+            match = DEPENDENCY_REGEX.match(dep)
+            if match:
+                if match.group(1) and py_version is None:
+                    py_version = match.group(3)
+                elif match.group(2) and r_version is None:
+                    r_version = match.group(3)
+            if py_version is not None and r_version is not None and uses_r:
+                break
+
+        self._scanned_dependencies = (py_version, r_version, uses_r)
+        return self._scanned_dependencies
 
     @property
     def python_version(self):
@@ -185,16 +271,7 @@ class CondaBuildPack(BaseImage):
         Version information below the minor level is dropped.
         """
         if not hasattr(self, "_python_version"):
-            py_version = None
-            env = self.environment_yaml
-            for dep in env.get("dependencies", []):
-                if not isinstance(dep, str):
-                    continue
-                match = PYTHON_REGEX.match(dep)
-                if not match:
-                    continue
-                py_version = match.group(1)
-                break
+            py_version = self._scan_dependencies()[0]
 
             # extract major.minor
             if py_version:
@@ -210,23 +287,14 @@ class CondaBuildPack(BaseImage):
 
     @property
     def r_version(self):
-        """Detect the Python version for a given `environment.yml`
+        """Detect the R version for a given `environment.yml`
 
         Will return 'x.y' if version is found (e.g '3.6'),
         or a Falsy empty string '' if not found.
 
         """
         if not hasattr(self, "_r_version"):
-            self._r_version = ""
-            env = self.environment_yaml
-            for dep in env.get("dependencies", []):
-                if not isinstance(dep, str):
-                    continue
-                match = R_REGEX.match(dep)
-                if not match:
-                    continue
-                self._r_version = match.group(1)
-                break
+            self._r_version = self._scan_dependencies()[1] or ""
 
         return self._r_version
 
@@ -237,14 +305,7 @@ class CondaBuildPack(BaseImage):
         Will return True when a package prefixed with 'r-' is being installed.
         """
         if not hasattr(self, "_uses_r"):
-            deps = self.environment_yaml.get("dependencies", [])
-            self._uses_r = False
-            for dep in deps:
-                if not isinstance(dep, str):
-                    continue
-                if dep.startswith("r-"):
-                    self._uses_r = True
-                    break
+            self._uses_r = self._scan_dependencies()[2]
 
         return self._uses_r
 
@@ -275,14 +336,8 @@ class CondaBuildPack(BaseImage):
             scripts.append(
                 (
                     "${NB_USER}",
-                    r"""
-                TIMEFORMAT='time: %3R' \
-                bash -c 'time mamba env update -p {0} -f "{1}" && \
-                time mamba clean --all -f -y && \
-                mamba list -p {0} \
-                '
-                """.format(
-                        env_prefix, environment_yml
+                    ENV_UPDATE_TEMPLATE.format(
+                        env_prefix=env_prefix, environment_yml=environment_yml
                     ),
                 )
             )
@@ -295,37 +350,20 @@ class CondaBuildPack(BaseImage):
             scripts.append(
                 (
                     "${NB_USER}",
-                    r"""
-                mamba install -p {0} r-base{1} r-irkernel={2} r-devtools -y && \
-                mamba clean --all -f -y && \
-                mamba list -p {0}
-                """.format(
-                        env_prefix, r_pin, IRKERNEL_VERSION
+                    R_INSTALL_TEMPLATE.format(
+                        env_prefix=env_prefix,
+                        r_pin=r_pin,
+                        irkernel_version=IRKERNEL_VERSION,
                     ),
                 )
             )
             scripts += rstudio_base_scripts()
             scripts += [
-                (
-                    "root",
-                    r"""
-                    echo auth-none=1 >> /etc/rstudio/rserver.conf && \
-                    echo auth-minimum-user-id=0 >> /etc/rstudio/rserver.conf && \
-                    echo "rsession-which-r={0}/bin/R" >> /etc/rstudio/rserver.conf && \
-                    echo "rsession-ld-library-path={0}/lib" >> /etc/rstudio/rserver.conf && \
-                    echo www-frame-origin=same >> /etc/rstudio/rserver.conf
-                    """.format(
-                        env_prefix
-                    ),
-                ),
+                ("root", RSTUDIO_CONF_TEMPLATE.format(env_prefix=env_prefix)),
                 (
                     "${NB_USER}",
                     # Install a pinned version of IRKernel and set it up for use!
-                    r"""
-                 R --quiet -e "IRkernel::installspec(prefix='{0}')"
-                 """.format(
-                        env_prefix
-                    ),
+                    IRKERNEL_TEMPLATE.format(env_prefix=env_prefix),
                 ),
             ]
         return scripts
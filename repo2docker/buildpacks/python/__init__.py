@@ -8,17 +8,27 @@ from ...utils import is_local_pip_requirement, open_guess_encoding
 class PythonBuildPack(CondaBuildPack):
     """Setup Python for use with a repository."""
 
+    @property
+    def runtime(self):
+        """
+        Return contents of runtime.txt if it exists, '' otherwise
+        """
+        if not hasattr(self, "_runtime"):
+            runtime_path = self.binder_path("runtime.txt")
+            try:
+                with open(runtime_path) as f:
+                    self._runtime = f.read().strip()
+            except FileNotFoundError:
+                self._runtime = ""
+
+        return self._runtime
+
     @property
     def python_version(self):
         if hasattr(self, "_python_version"):
             return self._python_version
 
-        try:
-            with open(self.binder_path("runtime.txt")) as f:
-                runtime = f.read().strip()
-        except FileNotFoundError:
-            runtime = ""
-
+        runtime = self.runtime
         if not runtime.startswith("python-"):
             # not a Python runtime (e.g. R, which subclasses this)
             # use the default Python
@@ -138,9 +148,7 @@ class PythonBuildPack(CondaBuildPack):
         setup_py = "setup.py"
 
         if os.path.exists(runtime_txt):
-            with open(runtime_txt) as f:
-                runtime = f.read().strip()
-            if runtime.startswith("python-"):
+            if self.runtime.startswith("python-"):
                 return True
             else:
                 return False
@@ -8,6 +8,17 @@ from distutils.version import LooseVersion as V
 from .python import PythonBuildPack
 from ._r_base import rstudio_base_scripts, DEVTOOLS_VERSION, IRKERNEL_VERSION
 
+# seconds to wait for MRAN when looking for a working snapshot
+MRAN_TIMEOUT = 30
+# run install.R before the repository is copied in, recording whether it worked
+INSTALL_R_PREASSEMBLE_TEMPLATE = (
+    "Rscript {installR_path} && touch /tmp/.preassembled || true"
+)
+# only run install.R again if the pre-assembly failed
+INSTALL_R_ASSEMBLE_TEMPLATE = (
+    "if [ ! -f /tmp/.preassembled ]; then Rscript {installR_path}; fi"
+)
+
 
 class RBuildPack(PythonBuildPack):
     """
@@ -46,21 +57,6 @@ class RBuildPack(PythonBuildPack):
     The `r-base-dev` package is installed as advised in RStudio instructions.
     """
 
-    @property
-    def runtime(self):
-        """
-        Return contents of runtime.txt if it exists, '' otherwise
-        """
-        if not hasattr(self, "_runtime"):
-            runtime_path = self.binder_path("runtime.txt")
-            try:
-                with open(runtime_path) as f:
-                    self._runtime = f.read().strip()
-            except FileNotFoundError:
-                self._runtime = ""
-
-        return self._runtime
-
     @property
     def r_version(self):
         """Detect the R version for a given `runtime.txt`
@@ -193,22 +189,37 @@ class RBuildPack(PythonBuildPack):
         Look for a working MRAN snapshot
 
         Starts from `startdate` and tries up to `max_prior` previous days.
-        Raises `requests.HTTPError` with the last tried URL if no working snapshot found.
+        A day whose snapshot does not answer within `MRAN_TIMEOUT` seconds is
+        skipped like a missing one.
+        Raises `requests.HTTPError` with the last tried URL if no working snapshot found,
+        or `requests.Timeout` if no tried day answered at all.
         """
-        for days in range(max_prior + 1):
-            test_date = startdate - datetime.timedelta(days=days)
-            mran_url = "https://mran.microsoft.com/snapshot/{}".format(
-                test_date.isoformat()
-            )
-            r = requests.head(mran_url)
-            if r.ok:
-                return test_date
-            self.log.warning(
-                "Failed to get MRAN snapshot URL %s: %s %s",
-                mran_url,
-                r.status_code,
-                r.reason,
-            )
+        r = None
+        # reuse one connection to MRAN for all the days we try
+        with requests.Session() as session:
+            for days in range(max_prior + 1):
+                test_date = startdate - datetime.timedelta(days=days)
+                mran_url = "https://mran.microsoft.com/snapshot/{}".format(
+                    test_date.isoformat()
+                )
+                try:
+                    r = session.head(mran_url, timeout=MRAN_TIMEOUT)
+                except requests.Timeout as e:
+                    timeout = e
+                    self.log.warning(
+                        "Failed to get MRAN snapshot URL %s: %s", mran_url, e
+                    )
+                    continue
+                if r.ok:
+                    return test_date
+                self.log.warning(
+                    "Failed to get MRAN snapshot URL %s: %s %s",
+                    mran_url,
+                    r.status_code,
+                    r.reason,
+                )
+        if r is None:
+            raise timeout
         r.raise_for_status()
 
     def get_build_scripts(self):
@@ -380,7 +391,7 @@ class RBuildPack(PythonBuildPack):
             scripts += [
                 (
                     "${NB_USER}",
-                    "Rscript %s && touch /tmp/.preassembled || true" % installR_path,
+                    INSTALL_R_PREASSEMBLE_TEMPLATE.format(installR_path=installR_path),
                 )
             ]
 
@@ -395,10 +406,7 @@ class RBuildPack(PythonBuildPack):
             assemble_scripts += [
                 (
                     "${NB_USER}",
-                    # only run install.R if the pre-assembly failed
-                    "if [ ! -f /tmp/.preassembled ]; then Rscript {}; fi".format(
-                        installR_path
-                    ),
+                    INSTALL_R_ASSEMBLE_TEMPLATE.format(installR_path=installR_path),
                 )
             ]
 
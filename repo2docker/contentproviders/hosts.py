@@ -0,0 +1,39 @@
+"""
+Helpers for ContentProviders configured with a list of hosts
+
+Each host is a dict with a "hostname" list of URL prefixes that sources of
+this host start with, plus provider specific keys.
+"""
+import json
+import os
+
+
+def load_hosts_file(path):
+    """Load the JSON list of hosts in the file at `path`
+
+    Every call parses the file again, so each provider gets its own hosts.
+    """
+    with open(os.path.expanduser(path)) as f:
+        return json.load(f)
+
+
+def hostnames(hosts):
+    """Return all hostname prefixes of validated `hosts` as one flat tuple
+
+    `source.startswith(hostnames(hosts))` rejects sources of none of the hosts
+    in a single call.
+    """
+    return tuple(prefix for host in hosts for prefix in host["hostname"])
+
+
+def host_prefixes(hosts):
+    """Return (hostname prefix, host) pairs of validated `hosts` in order"""
+    return tuple((prefix, host) for host in hosts for prefix in host["hostname"])
+
+
+def match_host(prefixes, source):
+    """Return the first host with a prefix of `source` in `prefixes`, or None"""
+    for prefix, host in prefixes:
+        if source.startswith(prefix):
+            return host
+    return None
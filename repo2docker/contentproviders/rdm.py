@@ -7,6 +7,7 @@ import uuid
 from urllib.parse import urlparse
 
 from .base import ContentProvider
+from .hosts import host_prefixes, hostnames, load_hosts_file, match_host
 
 from osfclient.api import OSF
 from osfclient.utils import is_path_matched
@@ -25,15 +26,18 @@ class RDM(ContentProvider):
             }
         ]
         if "RDM_HOSTS" in os.environ:
-            with open(os.path.expanduser(os.environ["RDM_HOSTS"])) as f:
-                self.hosts = json.load(f)
+            self.hosts = load_hosts_file(os.environ["RDM_HOSTS"])
         if "RDM_HOSTS_JSON" in os.environ:
             self.hosts = json.loads(os.environ["RDM_HOSTS_JSON"])
+        self._hostnames = ()
+        self._host_prefixes = ()
         if isinstance(self.hosts, list):
             for host in self.hosts:
                 if "hostname" not in host:
                     raise ValueError("No hostname: {}".format(json.dumps(host)))
-                if not isinstance(host["hostname"], list):
+                if not isinstance(host["hostname"], list) or not all(
+                    isinstance(prefix, str) for prefix in host["hostname"]
+                ):
                     raise ValueError(
                         "hostname should be list of string: {}".format(
                             json.dumps(host["hostname"])
@@ -41,28 +45,27 @@ class RDM(ContentProvider):
                     )
                 if "api" not in host:
                     raise ValueError("No api: {}".format(json.dumps(host)))
+            self._hostnames = hostnames(self.hosts)
+            self._host_prefixes = host_prefixes(self.hosts)
 
     def detect(self, source, ref=None, extra_args=None):
         """Trigger this provider for directory on RDM"""
-        for host in self.hosts:
-            if any([source.startswith(s) for s in host["hostname"]]):
-                u = urlparse(source)
-                path = u.path[1:] if u.path.startswith("/") else u.path
-                if "/" in path:
-                    self.project_id, self.path = path.split("/", 1)
-                    if self.path.startswith("files/"):
-                        self.path = self.path[len("files/") :]
-                else:
-                    self.project_id = path
-                    self.path = ""
-                self.uuid = ref if ref is not None else str(uuid.uuid1())
-                return {
-                    "project_id": self.project_id,
-                    "path": self.path,
-                    "host": host,
-                    "uuid": self.uuid,
-                }
-        return None
+        if not source.startswith(self._hostnames):
+            return None
+        host = match_host(self._host_prefixes, source)
+
+        u = urlparse(source)
+        path = u.path[1:] if u.path.startswith("/") else u.path
+        self.project_id, _, self.path = path.partition("/")
+        if self.path.startswith("files/"):
+            self.path = self.path[len("files/") :]
+        self.uuid = ref if ref is not None else str(uuid.uuid1())
+        return {
+            "project_id": self.project_id,
+            "path": self.path,
+            "host": host,
+            "uuid": self.uuid,
+        }
 
     def fetch(self, spec, output_dir, yield_output=False):
         """Fetch RDM directory"""
@@ -81,9 +84,9 @@ class RDM(ContentProvider):
         project = osf.project(project_id)
 
         if len(path):
-            storage = project.storage(path[: path.index("/")] if "/" in path else path)
-            subpath = path[path.index("/") :] if "/" in path else "/"
-            for line in self._fetch_storage(storage, output_dir, subpath):
+            storage_name, _, subpath = path.partition("/")
+            storage = project.storage(storage_name)
+            for line in self._fetch_storage(storage, output_dir, "/" + subpath):
                 yield line
         else:
             for storage in project.storages:
@@ -101,6 +104,10 @@ class RDM(ContentProvider):
         files = (
             storage.files if path_filter is None else storage.matched_files(path_filter)
         )
+        # directories already created, files of a folder are usually listed together
+        made_dirs = set()
+        # downloads stay sequential, osfclient shares one requests session
+        # between all files of a project
         for file_ in files:
             if path is None:
                 local_path = storage.provider + file_.path
@@ -108,8 +115,9 @@ class RDM(ContentProvider):
                 local_path = file_.path[len(path) :]
             local_full_path = os.path.join(output_dir, local_path)
             local_dir, _ = os.path.split(local_full_path)
-            if not os.path.isdir(local_dir):
-                os.makedirs(local_dir)
+            if local_dir not in made_dirs:
+                os.makedirs(local_dir, exist_ok=True)
+                made_dirs.add(local_dir)
             with open(local_full_path, "wb") as f:
                 file_.write_to(f)
             yield "Fetch: {} ({} to {})".format(file_.path, local_path, output_dir)
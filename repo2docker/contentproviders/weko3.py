@@ -4,18 +4,29 @@ import json
 import shutil
 import uuid
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib import request
 from urllib.request import Request
 from urllib.parse import urlparse
 
 from .. import __version__
 from .base import ContentProvider
+from .hosts import host_prefixes, hostnames, load_hosts_file, match_host
 
 
 class WEKO3(ContentProvider):
-    """Provide contents of WEKO3."""
+    """Provide contents of WEKO3.
+
+    Hosts are read from the JSON file named by `WEKO3_HOSTS` or from the JSON
+    in `WEKO3_HOSTS_JSON`. Files are downloaded with the host's "token", or
+    `WEKO3_TOKEN` when the host has none. `WEKO3_PARALLEL` sets how many files
+    are downloaded at the same time, defaults to 6.
+    """
+
+    default_max_workers = 6
 
     def __init__(self):
+        super().__init__()
         self.hosts = [
             {
                 "hostname": [
@@ -25,15 +36,18 @@ class WEKO3(ContentProvider):
             }
         ]
         if "WEKO3_HOSTS" in os.environ:
-            with open(os.path.expanduser(os.environ["WEKO3_HOSTS"])) as f:
-                self.hosts = json.load(f)
+            self.hosts = load_hosts_file(os.environ["WEKO3_HOSTS"])
         if "WEKO3_HOSTS_JSON" in os.environ:
             self.hosts = json.loads(os.environ["WEKO3_HOSTS_JSON"])
+        self._hostnames = ()
+        self._host_prefixes = ()
         if isinstance(self.hosts, list):
             for host in self.hosts:
                 if "hostname" not in host:
                     raise ValueError("No hostname: {}".format(json.dumps(host)))
-                if not isinstance(host["hostname"], list):
+                if not isinstance(host["hostname"], list) or not all(
+                    isinstance(prefix, str) for prefix in host["hostname"]
+                ):
                     raise ValueError(
                         "hostname should be list of string: {}".format(
                             json.dumps(host["hostname"])
@@ -41,25 +55,28 @@ class WEKO3(ContentProvider):
                     )
                 if "file_base_url" not in host:
                     raise ValueError("No file_base_url: {}".format(json.dumps(host)))
+            self._hostnames = hostnames(self.hosts)
+            self._host_prefixes = host_prefixes(self.hosts)
 
     def detect(self, source, ref=None, extra_args=None):
         """Trigger this provider for directory on WEKO3"""
-        for host in self.hosts:
-            if any([source.startswith(s) for s in host["hostname"]]):
-                u = urlparse(source)
-                path = u.path[1:] if u.path.startswith("/") else u.path
-                if "/" not in path:
-                    raise ValueError("file_names is not defined: {}".format(path))
-                self.bucket, file_names = path.split("/", 1)
-                self.file_names = file_names.split(",")
-                self.uuid = ref if ref is not None else str(uuid.uuid1())
-                return {
-                    "bucket": self.bucket,
-                    "file_names": self.file_names,
-                    "host": host,
-                    "uuid": self.uuid,
-                }
-        return None
+        if not source.startswith(self._hostnames):
+            return None
+        host = match_host(self._host_prefixes, source)
+
+        u = urlparse(source)
+        path = u.path[1:] if u.path.startswith("/") else u.path
+        if "/" not in path:
+            raise ValueError("file_names is not defined: {}".format(path))
+        self.bucket, file_names = path.split("/", 1)
+        self.file_names = file_names.split(",")
+        self.uuid = ref if ref is not None else str(uuid.uuid1())
+        return {
+            "bucket": self.bucket,
+            "file_names": self.file_names,
+            "host": host,
+            "uuid": self.uuid,
+        }
 
     def fetch(self, spec, output_dir, yield_output=False):
         """Fetch WEKO3 directory"""
@@ -79,17 +96,55 @@ class WEKO3(ContentProvider):
         if access_token is None:
             raise ValueError("Token is not set")
 
-        for file_name in file_names:
-            file_url = file_base_url + "/" + bucket + "/" + file_name
-            output_file = os.path.join(output_dir, file_name)
-            yield "Fetch: {} to {}\n".format(file_url, output_file)
-            req = Request(
-                file_url,
-                headers={"Authorization": "Bearer " + access_token},
+        with ThreadPoolExecutor(max_workers=self._max_workers()) as executor:
+            # downloaded files are reported in the order they complete
+            messages = {}
+            for file_name in file_names:
+                file_url = file_base_url + "/" + bucket + "/" + file_name
+                output_file = os.path.join(output_dir, file_name)
+                req = Request(
+                    file_url,
+                    headers={"Authorization": "Bearer " + access_token},
+                )
+                future = executor.submit(self._fetch_file, req, output_file)
+                messages[future] = "Fetch: {} to {}\n".format(file_url, output_file)
+            try:
+                for future in as_completed(messages):
+                    future.result()
+                    yield messages[future]
+            finally:
+                # do not wait for the remaining downloads after a failure
+                for future in messages:
+                    future.cancel()
+
+    def _max_workers(self):
+        """Number of files downloaded at the same time, from WEKO3_PARALLEL"""
+        value = os.environ.get("WEKO3_PARALLEL")
+        if value is None:
+            return self.default_max_workers
+        try:
+            max_workers = int(value)
+        except ValueError:
+            self.log.warning(
+                "Ignoring invalid WEKO3_PARALLEL=%r, using %s",
+                value,
+                self.default_max_workers,
+            )
+            return self.default_max_workers
+        if max_workers < 1:
+            self.log.warning(
+                "Ignoring WEKO3_PARALLEL=%s below 1, using %s",
+                max_workers,
+                self.default_max_workers,
             )
-            resp = self.urlopen(req)
-            with open(output_file, "wb") as f:
-                f.write(resp.read())
+            return self.default_max_workers
+        return max_workers
+
+    def _fetch_file(self, req, output_file):
+        """Download a single file, run in a worker thread"""
+        with self.urlopen(req) as resp, open(output_file, "wb") as f:
+            # stream the body instead of holding the whole file in memory
+            shutil.copyfileobj(resp, f, 1024 * 1024)
 
     @property
     def content_id(self):
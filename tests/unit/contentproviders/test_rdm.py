@@ -1,104 +1,111 @@
-import os
 import json
 import re
-from tempfile import TemporaryDirectory, NamedTemporaryFile
+from types import SimpleNamespace
 
 from unittest.mock import patch, MagicMock
 
+import pytest
+
 from osfclient.api import OSF
 from repo2docker.contentproviders import RDM
 
+UUID_REGEX = re.compile(r"[0-9A-Fa-f\-]+")
+
+test_rdm_urls = [
+    ("https://test.some.host.nii.ac.jp/x1234", None, ""),
+    ("https://test.some.host.nii.ac.jp/x1234/files/test/xxx", "X1234", "test/xxx"),
+    ("https://test.some.host.nii.ac.jp/x1234/test/xxx", "A5678", "test/xxx"),
+    ("https://test.some.host.nii.ac.jp/x1234/files/test", "X1234", "test"),
+]
+
 
-def test_detect_rdm_url():
+@pytest.mark.parametrize("url,ref,path", test_rdm_urls)
+def test_detect_rdm_url(url, ref, path):
     rdm = RDM()
-    spec = rdm.detect("https://test.some.host.nii.ac.jp/x1234")
+    spec = rdm.detect(url, ref)
 
     assert spec is not None, spec
     assert spec["project_id"] == "x1234"
-    assert spec["path"] == ""
-    assert re.match(r"^[0-9A-Fa-f\-]+$", spec["uuid"]) is not None
+    assert spec["path"] == path
+    if ref is None:
+        assert UUID_REGEX.fullmatch(spec["uuid"]) is not None
+    else:
+        assert spec["uuid"] == ref
     assert spec["host"]["api"] == "https://api.test.some.host.nii.ac.jp/v2/"
 
+
+def test_not_detect_rdm_url():
+    rdm = RDM()
+    spec = rdm.detect("https://unknown.some.host.nii.ac.jp/x1234")
+
+    assert spec is None, spec
+
+
+test_external_hosts = json.dumps(
+    [
+        {
+            "hostname": [
+                "https://test1.some.host.nii.ac.jp/",
+            ],
+            "api": "https://api.test1.some.host.nii.ac.jp/v2/",
+        }
+    ]
+)
+
+
+def test_detect_external_rdm_url(monkeypatch, tmpdir):
+    hosts_file = tmpdir.join("hosts.json")
+    hosts_file.write(test_external_hosts)
+    monkeypatch.setenv("RDM_HOSTS", str(hosts_file))
+
     rdm = RDM()
-    spec = rdm.detect("https://test.some.host.nii.ac.jp/x1234/files/test/xxx", "X1234")
+    spec = rdm.detect("https://test1.some.host.nii.ac.jp/x1234")
 
     assert spec is not None, spec
     assert spec["project_id"] == "x1234"
-    assert spec["path"] == "test/xxx"
-    assert spec["uuid"] == "X1234"
-    assert spec["host"]["api"] == "https://api.test.some.host.nii.ac.jp/v2/"
+    assert spec["path"] == ""
+    assert spec["host"]["api"] == "https://api.test1.some.host.nii.ac.jp/v2/"
 
-    rdm = RDM()
-    spec = rdm.detect("https://test.some.host.nii.ac.jp/x1234/test/xxx", "A5678")
+    spec = rdm.detect("https://test1.some.host.nii.ac.jp/x1234/files/test/xxx", "")
 
     assert spec is not None, spec
     assert spec["project_id"] == "x1234"
     assert spec["path"] == "test/xxx"
-    assert spec["uuid"] == "A5678"
-    assert spec["host"]["api"] == "https://api.test.some.host.nii.ac.jp/v2/"
+    assert spec["host"]["api"] == "https://api.test1.some.host.nii.ac.jp/v2/"
 
-    rdm = RDM()
-    spec = rdm.detect("https://test.some.host.nii.ac.jp/x1234/files/test", "X1234")
+    spec = rdm.detect("https://test1.some.host.nii.ac.jp/x1234/test/xxx", "")
 
     assert spec is not None, spec
     assert spec["project_id"] == "x1234"
-    assert spec["path"] == "test"
-    assert spec["uuid"] == "X1234"
-    assert spec["host"]["api"] == "https://api.test.some.host.nii.ac.jp/v2/"
+    assert spec["path"] == "test/xxx"
+    assert spec["host"]["api"] == "https://api.test1.some.host.nii.ac.jp/v2/"
 
 
-def test_not_detect_rdm_url():
-    rdm = RDM()
-    spec = rdm.detect("https://unknown.some.host.nii.ac.jp/x1234")
+def test_external_rdm_hosts_are_not_shared(monkeypatch, tmpdir):
+    hosts_file = tmpdir.join("hosts.json")
+    hosts_file.write(test_external_hosts)
+    monkeypatch.setenv("RDM_HOSTS", str(hosts_file))
 
-    assert spec is None, spec
+    spec = RDM().detect("https://test1.some.host.nii.ac.jp/x1234")
+    spec["host"]["api"] = "https://changed.example.org/v2/"
 
+    spec = RDM().detect("https://test1.some.host.nii.ac.jp/x1234")
+    assert spec["host"]["api"] == "https://api.test1.some.host.nii.ac.jp/v2/"
 
-def test_detect_external_rdm_url():
-    with NamedTemporaryFile("w+") as f:
-        try:
-            f.write(
-                json.dumps(
-                    [
-                        {
-                            "hostname": [
-                                "https://test1.some.host.nii.ac.jp/",
-                            ],
-                            "api": "https://api.test1.some.host.nii.ac.jp/v2/",
-                        }
-                    ]
-                )
-            )
-            f.flush()
-            os.environ["RDM_HOSTS"] = f.name
-
-            rdm = RDM()
-            spec = rdm.detect("https://test1.some.host.nii.ac.jp/x1234")
-
-            assert spec is not None, spec
-            assert spec["project_id"] == "x1234"
-            assert spec["path"] == ""
-            assert spec["host"]["api"] == "https://api.test1.some.host.nii.ac.jp/v2/"
-
-            rdm = RDM()
-            spec = rdm.detect(
-                "https://test1.some.host.nii.ac.jp/x1234/files/test/xxx", ""
-            )
-
-            assert spec is not None, spec
-            assert spec["project_id"] == "x1234"
-            assert spec["path"] == "test/xxx"
-            assert spec["host"]["api"] == "https://api.test1.some.host.nii.ac.jp/v2/"
-
-            rdm = RDM()
-            spec = rdm.detect("https://test1.some.host.nii.ac.jp/x1234/test/xxx", "")
-
-            assert spec is not None, spec
-            assert spec["project_id"] == "x1234"
-            assert spec["path"] == "test/xxx"
-            assert spec["host"]["api"] == "https://api.test1.some.host.nii.ac.jp/v2/"
-        finally:
-            del os.environ["RDM_HOSTS"]
+
+@pytest.mark.parametrize(
+    "hosts",
+    [
+        [{"api": "https://api.test1.some.host.nii.ac.jp/v2/"}],
+        [{"hostname": "https://test1.some.host.nii.ac.jp/", "api": "x"}],
+        [{"hostname": [1], "api": "https://api.test1.some.host.nii.ac.jp/v2/"}],
+        [{"hostname": ["https://test1.some.host.nii.ac.jp/"]}],
+    ],
+)
+def test_invalid_rdm_hosts(monkeypatch, hosts):
+    monkeypatch.setenv("RDM_HOSTS_JSON", json.dumps(hosts))
+    with pytest.raises(ValueError):
+        RDM()
 
 
 def test_content_id_is_unique():
@@ -115,85 +122,95 @@ def test_content_id_is_unique():
     assert rdm1.content_id != rdm2.content_id
 
 
-def test_fetch_content():
-    with TemporaryDirectory() as d:
-        rdm = RDM()
-        spec = {
-            "project_id": "x1234",
-            "path": "",
-            "host": {"api": "https://test.some.host/v2/"},
-        }
-        with patch.object(OSF, "project") as fake_project:
-            fake_file1 = MagicMock(path="/file1.txt")
-            fake_file2 = MagicMock(path="/test/file2.txt")
-            fake_storage1 = MagicMock(provider="samplestorage1", files=[fake_file1])
-            fake_storage2 = MagicMock(provider="samplestorage2", files=[fake_file2])
-            fake_project_obj = MagicMock(storages=[fake_storage1, fake_storage2])
-            fake_project.return_value = fake_project_obj
-            for msg in rdm.fetch(spec, d):
-                if msg.startswith("Fetching"):
-                    assert "x1234 at https://test.some.host/v2" in msg
-                elif msg.startswith("Fetch:") and "/file1.txt" in msg:
-                    assert "(samplestorage1/file1.txt to {})".format(d) in msg
-                elif msg.startswith("Fetch:") and "/test/file2.txt" in msg:
-                    assert "(samplestorage2/test/file2.txt to {})".format(d) in msg
-                else:
-                    assert False, msg
-
-        rdm = RDM()
-        spec = {
-            "project_id": "x1234",
-            "path": "samplestorage2/test",
-            "host": {"api": "https://test.some.host/v2/"},
-        }
-        with patch.object(OSF, "project") as fake_project:
-            fake_file1 = MagicMock(path="/file1.txt")
-            fake_file2 = MagicMock(path="/test/file2.txt")
-            fake_storage1 = MagicMock(provider="samplestorage1", files=[fake_file1])
-            fake_matched_files = MagicMock()
-            fake_matched_files.return_value = [fake_file2]
-            fake_storage2 = MagicMock(
-                provider="samplestorage2",
-                files=[fake_file2],
-                matched_files=fake_matched_files,
-            )
-            fake_storage = MagicMock()
-            fake_storage.return_value = fake_storage2
-            fake_project_obj = MagicMock(
-                storages=[fake_storage1, fake_storage2], storage=fake_storage
-            )
-            fake_project.return_value = fake_project_obj
-            for msg in rdm.fetch(spec, d):
-                if msg.startswith("Fetching"):
-                    assert "x1234 at https://test.some.host/v2" in msg
-                elif msg.startswith("Fetch:") and "/file2.txt" in msg:
-                    assert "(file2.txt to {})".format(d) in msg
-                else:
-                    assert False, msg
-            fake_storage.assert_called_once_with("samplestorage2")
-
-        rdm = RDM()
-        spec = {
-            "project_id": "x1234",
-            "path": "samplestorage1",
-            "host": {"api": "https://test.some.host/v2/"},
+test_storages = {
+    "samplestorage1": ["/file1.txt"],
+    "samplestorage2": ["/test/file2.txt", "/other/file3.txt"],
+}
+
+
+def fake_file(path):
+    return SimpleNamespace(path=path, write_to=lambda f: f.write(path.encode()))
+
+
+def fake_storage(provider, paths):
+    files = [fake_file(path) for path in paths]
+    return SimpleNamespace(
+        provider=provider,
+        files=files,
+        matched_files=lambda path_filter: [f for f in files if path_filter(f)],
+    )
+
+
+@pytest.fixture
+def fake_osf_project():
+    with patch.object(OSF, "project") as fake_project:
+        storages = {
+            provider: fake_storage(provider, paths)
+            for provider, paths in test_storages.items()
         }
-        with patch.object(OSF, "project") as fake_project:
-            fake_file1 = MagicMock(path="/file1.txt")
-            fake_file2 = MagicMock(path="/test/file2.txt")
-            fake_storage1 = MagicMock(provider="samplestorage1", files=[fake_file1])
-            fake_storage2 = MagicMock(provider="samplestorage2", files=[fake_file2])
-            fake_storage = MagicMock()
-            fake_storage.return_value = fake_storage1
-            fake_project_obj = MagicMock(
-                storages=[fake_storage1, fake_storage2], storage=fake_storage
-            )
-            fake_project.return_value = fake_project_obj
-            for msg in rdm.fetch(spec, d):
-                if msg.startswith("Fetching"):
-                    assert "x1234 at https://test.some.host/v2" in msg
-                elif msg.startswith("Fetch:") and "/file1.txt" in msg:
-                    assert "(file1.txt to {})".format(d) in msg
-                else:
-                    assert False, msg
-            fake_storage.assert_called_once_with("samplestorage1")
+        fake_storage_getter = MagicMock(side_effect=lambda name: storages[name])
+        fake_project_obj = MagicMock(
+            storages=list(storages.values()), storage=fake_storage_getter
+        )
+        fake_project.return_value = fake_project_obj
+        yield fake_project_obj
+
+
+# (path, storage, [(remote path, local path)])
+test_fetch_paths = [
+    (
+        "",
+        None,
+        [
+            ("/file1.txt", "samplestorage1/file1.txt"),
+            ("/test/file2.txt", "samplestorage2/test/file2.txt"),
+            ("/other/file3.txt", "samplestorage2/other/file3.txt"),
+        ],
+    ),
+    ("samplestorage2/test", "samplestorage2", [("/test/file2.txt", "file2.txt")]),
+    ("samplestorage1", "samplestorage1", [("/file1.txt", "file1.txt")]),
+]
+
+
+@pytest.mark.parametrize("path,storage,expected", test_fetch_paths)
+def test_fetch_content(tmpdir, fake_osf_project, path, storage, expected):
+    d = str(tmpdir)
+    rdm = RDM()
+    spec = {
+        "project_id": "x1234",
+        "path": path,
+        "host": {"api": "https://test.some.host/v2/"},
+    }
+    msgs = list(rdm.fetch(spec, d))
+    assert msgs[0].startswith("Fetching")
+    assert "x1234 at https://test.some.host/v2" in msgs[0]
+    assert msgs[1:] == [
+        "Fetch: {} ({} to {})".format(remote_path, local_path, d)
+        for remote_path, local_path in expected
+    ]
+    assert sorted(str(f.relto(tmpdir)) for f in tmpdir.visit() if f.isfile()) == sorted(
+        local_path for _, local_path in expected
+    )
+    for remote_path, local_path in expected:
+        assert tmpdir.join(local_path).read_binary() == remote_path.encode()
+    if storage is None:
+        fake_osf_project.storage.assert_not_called()
+    else:
+        fake_osf_project.storage.assert_called_once_with(storage)
+
+
+def test_fetch_propagates_download_error(tmpdir, fake_osf_project):
+    def fail(f):
+        raise IOError("download failed")
+
+    broken = fake_osf_project.storage("samplestorage1")
+    broken.files[0].write_to = fail
+    rdm = RDM()
+    spec = {
+        "project_id": "x1234",
+        "path": "samplestorage1",
+        "host": {"api": "https://test.some.host/v2/"},
+    }
+    with pytest.raises(IOError, match="download failed"):
+        for msg in rdm.fetch(spec, str(tmpdir)):
+            pass
@@ -1,12 +1,16 @@
 import os
 import json
 import re
-from tempfile import TemporaryDirectory, NamedTemporaryFile
+from io import BytesIO
 
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+
+import pytest
 
 from repo2docker.contentproviders import WEKO3
 
+UUID_REGEX = re.compile(r"[0-9A-Fa-f\-]+")
+
 
 def test_detect_weko3_url():
     weko3 = WEKO3()
@@ -15,12 +19,11 @@ def test_detect_weko3_url():
     assert spec is not None, spec
     assert spec["bucket"] == "abcdefgh-12345678"
     assert spec["file_names"] == ["test1.txt"]
-    assert re.match(r"^[0-9A-Fa-f\-]+$", spec["uuid"]) is not None
+    assert UUID_REGEX.fullmatch(spec["uuid"]) is not None
     assert (
         spec["host"]["file_base_url"] == "https://test.some.host.nii.ac.jp/api/files/"
     )
 
-    weko3 = WEKO3()
     spec = weko3.detect(
         "https://test.some.host.nii.ac.jp/abcdefgh-12345678/test1.txt,test2.txt",
         "X1234",
@@ -42,49 +45,70 @@ def test_not_detect_rdm_url():
     assert spec is None, spec
 
 
-def test_detect_external_rdm_url():
-    with NamedTemporaryFile("w+") as f:
-        try:
-            f.write(
-                json.dumps(
-                    [
-                        {
-                            "hostname": [
-                                "https://test1.some.host.nii.ac.jp/",
-                            ],
-                            "file_base_url": "https://test1.some.host.nii.ac.jp/api/files/",
-                        }
-                    ]
-                )
-            )
-            f.flush()
-            os.environ["WEKO3_HOSTS"] = f.name
-
-            weko3 = WEKO3()
-            spec = weko3.detect("https://test1.some.host.nii.ac.jp/x1234/t.txt")
-
-            assert spec is not None, spec
-            assert spec["bucket"] == "x1234"
-            assert spec["file_names"] == ["t.txt"]
-            assert (
-                spec["host"]["file_base_url"]
-                == "https://test1.some.host.nii.ac.jp/api/files/"
-            )
+test_external_hosts = json.dumps(
+    [
+        {
+            "hostname": [
+                "https://test1.some.host.nii.ac.jp/",
+            ],
+            "file_base_url": "https://test1.some.host.nii.ac.jp/api/files/",
+        }
+    ]
+)
 
-            weko3 = WEKO3()
-            spec = weko3.detect(
-                "https://test1.some.host.nii.ac.jp/x1234/t1.txt,t2.txt", ""
-            )
 
-            assert spec is not None, spec
-            assert spec["bucket"] == "x1234"
-            assert spec["file_names"] == ["t1.txt", "t2.txt"]
-            assert (
-                spec["host"]["file_base_url"]
-                == "https://test1.some.host.nii.ac.jp/api/files/"
-            )
-        finally:
-            del os.environ["WEKO3_HOSTS"]
+def test_detect_external_rdm_url(monkeypatch, tmpdir):
+    hosts_file = tmpdir.join("hosts.json")
+    hosts_file.write(test_external_hosts)
+    monkeypatch.setenv("WEKO3_HOSTS", str(hosts_file))
+
+    weko3 = WEKO3()
+    spec = weko3.detect("https://test1.some.host.nii.ac.jp/x1234/t.txt")
+
+    assert spec is not None, spec
+    assert spec["bucket"] == "x1234"
+    assert spec["file_names"] == ["t.txt"]
+    assert (
+        spec["host"]["file_base_url"] == "https://test1.some.host.nii.ac.jp/api/files/"
+    )
+
+    spec = weko3.detect("https://test1.some.host.nii.ac.jp/x1234/t1.txt,t2.txt", "")
+
+    assert spec is not None, spec
+    assert spec["bucket"] == "x1234"
+    assert spec["file_names"] == ["t1.txt", "t2.txt"]
+    assert (
+        spec["host"]["file_base_url"] == "https://test1.some.host.nii.ac.jp/api/files/"
+    )
+
+
+def test_external_weko3_hosts_are_not_shared(monkeypatch, tmpdir):
+    hosts_file = tmpdir.join("hosts.json")
+    hosts_file.write(test_external_hosts)
+    monkeypatch.setenv("WEKO3_HOSTS", str(hosts_file))
+
+    spec = WEKO3().detect("https://test1.some.host.nii.ac.jp/x1234/t.txt")
+    spec["host"]["file_base_url"] = "https://changed.example.org/api/files/"
+
+    spec = WEKO3().detect("https://test1.some.host.nii.ac.jp/x1234/t.txt")
+    assert (
+        spec["host"]["file_base_url"] == "https://test1.some.host.nii.ac.jp/api/files/"
+    )
+
+
+@pytest.mark.parametrize(
+    "hosts",
+    [
+        [{"file_base_url": "https://test1.some.host.nii.ac.jp/api/files/"}],
+        [{"hostname": "https://test1.some.host.nii.ac.jp/", "file_base_url": "x"}],
+        [{"hostname": [1], "file_base_url": "x"}],
+        [{"hostname": ["https://test1.some.host.nii.ac.jp/"]}],
+    ],
+)
+def test_invalid_weko3_hosts(monkeypatch, hosts):
+    monkeypatch.setenv("WEKO3_HOSTS_JSON", json.dumps(hosts))
+    with pytest.raises(ValueError):
+        WEKO3()
 
 
 def test_content_id_is_unique():
@@ -101,44 +125,65 @@ def test_content_id_is_unique():
     assert weko3_1.content_id != weko3_2.content_id
 
 
-def test_fetch_content():
-    with TemporaryDirectory() as d:
-        weko3 = WEKO3()
-        spec = {
-            "bucket": "x1234",
-            "file_names": ["t1.txt", "t2.txt"],
-            "host": {
-                "file_base_url": "https://test.some.host/api/files/",
-                "token": "TEST",
-            },
-        }
-        with patch.object(WEKO3, "urlopen") as fake_urlopen:
-            fake_read = MagicMock()
-            fake_read.return_value = b"1234567890"
-            fake_urlopen.return_value = MagicMock(read=fake_read)
-            for msg in weko3.fetch(spec, d):
-                if msg.startswith("Fetching"):
-                    assert "x1234 at https://test.some.host/api/files" in msg
-                elif msg.startswith("Fetch:") and "/t1.txt" in msg:
-                    assert "to {}/t1.txt".format(d) in msg
-                elif msg.startswith("Fetch:") and "/t2.txt" in msg:
-                    assert "to {}/t2.txt".format(d) in msg
-                else:
-                    assert False, msg
-            assert fake_urlopen.call_count == 2
-            assert (
-                fake_urlopen.call_args_list[0][0][0].full_url
-                == "https://test.some.host/api/files/x1234/t1.txt"
-            )
-            assert (
-                fake_urlopen.call_args_list[0][0][0].get_header("Authorization")
-                == "Bearer TEST"
-            )
-            assert (
-                fake_urlopen.call_args_list[1][0][0].full_url
-                == "https://test.some.host/api/files/x1234/t2.txt"
-            )
-            assert (
-                fake_urlopen.call_args_list[1][0][0].get_header("Authorization")
-                == "Bearer TEST"
+def test_fetch_content(tmpdir):
+    d = str(tmpdir)
+    weko3 = WEKO3()
+    spec = {
+        "bucket": "x1234",
+        "file_names": ["t1.txt", "t2.txt"],
+        "host": {
+            "file_base_url": "https://test.some.host/api/files/",
+            "token": "TEST",
+        },
+    }
+    with patch.object(WEKO3, "urlopen") as fake_urlopen:
+        fake_urlopen.side_effect = lambda req: BytesIO(b"1234567890")
+        msgs = list(weko3.fetch(spec, d))
+        assert msgs[0].startswith("Fetching")
+        assert "x1234 at https://test.some.host/api/files" in msgs[0]
+        # files are downloaded concurrently, progress may come in any order
+        assert sorted(msgs[1:]) == [
+            "Fetch: https://test.some.host/api/files/x1234/{0} to {1}\n".format(
+                file_name, os.path.join(d, file_name)
             )
+            for file_name in ["t1.txt", "t2.txt"]
+        ]
+        assert fake_urlopen.call_count == 2
+        # files are downloaded concurrently, requests may be in any order
+        reqs = sorted(
+            (call[0][0] for call in fake_urlopen.call_args_list),
+            key=lambda req: req.full_url,
+        )
+        assert reqs[0].full_url == "https://test.some.host/api/files/x1234/t1.txt"
+        assert reqs[0].get_header("Authorization") == "Bearer TEST"
+        assert reqs[1].full_url == "https://test.some.host/api/files/x1234/t2.txt"
+        assert reqs[1].get_header("Authorization") == "Bearer TEST"
+    for file_name in ["t1.txt", "t2.txt"]:
+        with open(os.path.join(d, file_name), "rb") as f:
+            assert f.read() == b"1234567890"
+
+
+def test_fetch_propagates_download_error(tmpdir):
+    weko3 = WEKO3()
+    spec = {
+        "bucket": "x1234",
+        "file_names": ["t1.txt", "t2.txt"],
+        "host": {
+            "file_base_url": "https://test.some.host/api/files/",
+            "token": "TEST",
+        },
+    }
+
+    def fail(req):
+        raise IOError("download failed")
+
+    with patch.object(WEKO3, "urlopen", side_effect=fail):
+        with pytest.raises(IOError, match="download failed"):
+            for msg in weko3.fetch(spec, str(tmpdir)):
+                pass
+
+
+@pytest.mark.parametrize("value,expected", [("3", 3), ("0", 6), ("x", 6)])
+def test_parallel_downloads(monkeypatch, value, expected):
+    monkeypatch.setenv("WEKO3_PARALLEL", value)
+    assert WEKO3()._max_workers() == expected
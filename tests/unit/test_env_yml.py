@@ -4,6 +4,8 @@ Test if the environment.yml is empty or it constains other data structure than a
 import os
 import sys
 import pytest
+from unittest.mock import patch
+from ruamel.yaml.constructor import DuplicateKeyError
 from repo2docker import buildpacks
 
 
@@ -17,6 +19,14 @@ def test_empty_env_yml(tmpdir):
     assert py_ver == ""
 
 
+def test_empty_env_yml_is_not_parsed(tmpdir):
+    tmpdir.chdir()
+    tmpdir.join("environment.yml").write("")
+    with patch("repo2docker.buildpacks.conda.YAML") as fake_yaml:
+        assert buildpacks.CondaBuildPack().environment_yaml == {}
+    fake_yaml.assert_not_called()
+
+
 def test_no_dict_env_yml(tmpdir):
     tmpdir.chdir()
     q = tmpdir.join("environment.yml")
@@ -24,3 +34,50 @@ def test_no_dict_env_yml(tmpdir):
     bq = buildpacks.CondaBuildPack()
     with pytest.raises(TypeError):
         py_ver = bq.python_version
+
+
+def test_modified_env_yml_is_reloaded(tmpdir):
+    tmpdir.chdir()
+    p = tmpdir.join("environment.yml")
+    p.write("dependencies:\n  - python=3.6\n")
+    assert buildpacks.CondaBuildPack().python_version == "3.6"
+
+    p.write("dependencies:\n  - python=3.7.1\n  - numpy\n")
+    assert buildpacks.CondaBuildPack().python_version == "3.7"
+
+
+@pytest.mark.parametrize(
+    "pip_requirements, preassemble",
+    [
+        (["numpy", "requests==2.22.0"], True),
+        (["-e git+https://github.com/jupyterhub/repo2docker#egg=r2d"], True),
+        (["numpy", "-e ."], False),
+        (["./local-package"], False),
+        (["git://../local/file"], False),
+    ],
+)
+def test_env_yml_local_pip_requirements(tmpdir, pip_requirements, preassemble):
+    tmpdir.chdir()
+    lines = ["dependencies:", "  - pip:"]
+    lines += ["    - '{}'".format(line) for line in pip_requirements]
+    tmpdir.join("environment.yml").write("\n".join(lines) + "\n")
+    bp = buildpacks.CondaBuildPack()
+    assert bp._should_preassemble_env is preassemble
+
+
+def test_env_yml_is_parsed_as_yaml_1_2(tmpdir):
+    tmpdir.chdir()
+    p = tmpdir.join("environment.yml")
+    p.write("name: on\ndependencies:\n  - no\n  - 010\n")
+    bp = buildpacks.CondaBuildPack()
+    # YAML 1.1 would turn these into booleans and an octal number
+    assert bp.environment_yaml == {"name": "on", "dependencies": ["no", 10]}
+
+
+def test_env_yml_duplicate_keys(tmpdir):
+    tmpdir.chdir()
+    p = tmpdir.join("environment.yml")
+    p.write("name: a\nname: b\n")
+    bp = buildpacks.CondaBuildPack()
+    with pytest.raises(DuplicateKeyError):
+        bp.environment_yaml
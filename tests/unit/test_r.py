@@ -1,6 +1,7 @@
 from datetime import date
 
 import pytest
+import requests
 from requests.models import Response
 from unittest.mock import patch
 
@@ -66,7 +67,7 @@ def test_mran_date(tmpdir, runtime, expected):
 
 @pytest.mark.parametrize("expected", ["2019-12-29", "2019-12-26"])
 def test_mran_latestdate(tmpdir, expected):
-    def mock_request_head(url):
+    def mock_request_head(url, **kwargs):
         r = Response()
         if url == "https://mran.microsoft.com/snapshot/" + expected:
             r.status_code = 200
@@ -80,7 +81,7 @@ def test_mran_latestdate(tmpdir, expected):
     with open("DESCRIPTION", "w") as f:
         f.write("")
 
-    with patch("requests.head", side_effect=mock_request_head):
+    with patch("requests.Session.head", side_effect=mock_request_head):
         with patch("datetime.date") as mockdate:
             mockdate.today.return_value = date(2019, 12, 31)
             r = buildpacks.RBuildPack()
@@ -88,6 +89,37 @@ def test_mran_latestdate(tmpdir, expected):
     assert r.checkpoint_date.isoformat() == expected
 
 
+def test_mran_timeout_tries_earlier_date(tmpdir):
+    def mock_request_head(url, **kwargs):
+        if url == "https://mran.microsoft.com/snapshot/2019-12-29":
+            raise requests.Timeout("Mock MRAN timeout")
+        r = Response()
+        r.status_code = 200
+        return r
+
+    tmpdir.chdir()
+
+    with open("DESCRIPTION", "w") as f:
+        f.write("")
+
+    with patch("requests.Session.head", side_effect=mock_request_head):
+        with patch("datetime.date") as mockdate:
+            mockdate.today.return_value = date(2019, 12, 31)
+            r = buildpacks.RBuildPack()
+            r.detect()
+    assert r.checkpoint_date.isoformat() == "2019-12-28"
+
+
+def test_mran_timeout_on_every_date():
+    r = buildpacks.RBuildPack()
+    with patch(
+        "requests.Session.head", side_effect=requests.Timeout("Mock MRAN timeout")
+    ) as mock_head:
+        with pytest.raises(requests.Timeout):
+            r._get_latest_working_mran_date(date(2019, 12, 29), 3)
+    assert mock_head.call_count == 4
+
+
 def test_install_from_base(tmpdir):
     # check that for R==3.4 we install from ubuntu
     tmpdir.chdir()